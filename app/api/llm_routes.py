@@ -11,23 +11,24 @@ class PromptRequest(BaseModel):
     prompt: str
     use_rag: bool = True
     use_tools: bool = True
+    user_id: str = "default"  # 会话隔离：每个用户独立的对话历史
 
 # 🪄 非流式接口（调试备用）
 @router.post("/chat")
 async def chat(req: PromptRequest):
-    result = await process_prompt(req.prompt, use_rag=req.use_rag, use_tools=req.use_tools)
+    result = await process_prompt(req.prompt, use_rag=req.use_rag, use_tools=req.use_tools, user_id=req.user_id)
     return result
 
 @router.post("/chat/stream")
 async def chat_stream(req: PromptRequest):
     return StreamingResponse(
-        stream_prompt(req.prompt, use_rag=req.use_rag, use_tools=req.use_tools),
+        stream_prompt(req.prompt, use_rag=req.use_rag, use_tools=req.use_tools, user_id=req.user_id),
         media_type="text/plain"   #
     )
 
 # 🔢 获取带token统计的流式处理结果
 @router.post("/chat/stream/stats")
 async def chat_stream_stats(req: PromptRequest):
-    result = await stream_prompt_with_stats(req.prompt)
+    result = await stream_prompt_with_stats(req.prompt, user_id=req.user_id)
     return result
 
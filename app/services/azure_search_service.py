@@ -1,10 +1,11 @@
 # app/services/azure_search_service.py
+import asyncio
 import json
 import uuid
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
-from azure.search.documents import SearchClient
+from azure.search.documents import SearchIndexingBufferedSender
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.models import VectorizedQuery
 from azure.search.documents.indexes.models import (
@@ -25,23 +26,23 @@ from azure.core.credentials import AzureKeyCredential
 from langchain_openai import AzureOpenAIEmbeddings
 
 from app.core.config import settings
+from app.services.embedding_cache import embedding_cache
+from app.services.query_cache import query_embedding_cache
 
 
 class AzureSearchService:
     """Azure AI Search 服务，包含 embedding 生成和向量搜索功能"""
 
     def __init__(self):
-        # Azure AI Search 客户端
-        self.search_client = SearchClient(
-            endpoint=settings.azure_search_endpoint,
-            index_name=settings.azure_search_index_name,
-            credential=AzureKeyCredential(settings.azure_search_key)
-        )
-
+        # Azure AI Search 客户端：SearchClient从同一个SearchIndexClient派生，
+        # 两者共用底层HTTP管道与连接池，避免各自重复TCP+TLS握手
         self.index_client = SearchIndexClient(
             endpoint=settings.azure_search_endpoint,
             credential=AzureKeyCredential(settings.azure_search_key)
         )
+        self.search_client = self.index_client.get_search_client(
+            settings.azure_search_index_name
+        )
 
         # Azure OpenAI Embedding 客户端 (使用独立的embedding服务)
         self.embedding_client = AzureOpenAIEmbeddings(
@@ -52,12 +53,21 @@ class AzureSearchService:
             chunk_size=1000
         )
 
+        # 同步SDK调用的并发上限：防止线程池被占满，也避免触发服务端节流
+        self._sem = asyncio.Semaphore(8)
+
+    async def _run_blocking(self, func, *args):
+        """把阻塞的SDK调用放到线程池执行，信号量限流，保持事件循环响应"""
+        async with self._sem:
+            return await asyncio.to_thread(func, *args)
+
     async def ensure_index_exists(self) -> bool:
         """确保搜索索引存在，如果不存在则创建"""
         try:
             # 检查索引是否存在
             try:
-                self.index_client.get_index(settings.azure_search_index_name)
+                await self._run_blocking(self.index_client.get_index,
+                                         settings.azure_search_index_name)
                 print(f"✅ 索引 '{settings.azure_search_index_name}' 已存在")
                 return True
             except Exception:
@@ -163,7 +173,7 @@ class AzureSearchService:
                 semantic_search=semantic_search,
             )
 
-            result = self.index_client.create_index(index)
+            result = await self._run_blocking(self.index_client.create_index, index)
             print(f"✅ 成功创建索引: {result.name}")
             return True
 
@@ -174,8 +184,22 @@ class AzureSearchService:
     async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """使用 Azure OpenAI 生成文本向量"""
         try:
-            embeddings = await self.embedding_client.aembed_documents(texts)
-            return embeddings
+            model = settings.azure_openai_embedding_deployment
+
+            # 先查磁盘缓存，只有未命中的文本才发往API
+            results: List[List[float]] = [embedding_cache.get(model, text) for text in texts]
+            missing = [i for i, vec in enumerate(results) if vec is None]
+
+            if missing:
+                # 按长度降序送批：同一mini-batch内文本长度相近，减少短文本陪跑长文本的等待
+                missing.sort(key=lambda i: len(texts[i]), reverse=True)
+                embeddings = await self.embedding_client.aembed_documents([texts[i] for i in missing])
+                # 按原始位置还原，调用方感知不到重排
+                for i, vec in zip(missing, embeddings):
+                    results[i] = vec
+                    embedding_cache.put(model, texts[i], vec)
+
+            return results
         except Exception as e:
             print(f"❌ 生成embeddings失败: {str(e)}")
             return [[0.0] * settings.embedding_dimension for _ in texts]
@@ -183,7 +207,13 @@ class AzureSearchService:
     async def generate_single_embedding(self, text: str) -> List[float]:
         """生成单个文本的向量"""
         try:
+            model = settings.azure_openai_embedding_deployment
+            cached = embedding_cache.get(model, text)
+            if cached is not None:
+                return cached
+
             embedding = await self.embedding_client.aembed_query(text)
+            embedding_cache.put(model, text, embedding)
             return embedding
         except Exception as e:
             print(f"❌ 生成单个embedding失败: {str(e)}")
@@ -195,18 +225,18 @@ class AzureSearchService:
             # 确保索引存在
             await self.ensure_index_exists()
 
+            # 批量生成内容向量：N个文档一次embedding调用，而不是N次HTTP往返
+            contents = [doc.get("content", "") for doc in documents]
+            content_vectors = await self.generate_embeddings(contents)
+
             # 准备文档数据
             search_documents = []
             doc_ids = []
 
-            for doc in documents:
+            for doc, content, content_vector in zip(documents, contents, content_vectors):
                 doc_id = str(uuid.uuid4())
                 doc_ids.append(doc_id)
 
-                # 生成内容向量
-                content = doc.get("content", "")
-                content_vector = await self.generate_single_embedding(content)
-
                 search_doc = {
                     "id": doc_id,
                     "content": content,
@@ -220,10 +250,27 @@ class AzureSearchService:
                 }
                 search_documents.append(search_doc)
 
-            # 批量上传文档
-            result = self.search_client.upload_documents(search_documents)
+            # 通过缓冲发送器批量上传：自动聚批、503退避重试、并发发送，
+            # 替代单次upload_documents的手工批处理
+            failed_ids = set()
 
-            successful_uploads = [doc_id for doc_id, success in zip(doc_ids, result) if success.succeeded]
+            def _on_error(action):
+                doc = getattr(action, "additional_properties", None) or {}
+                failed_ids.add(doc.get("id"))
+
+            def _upload():
+                with SearchIndexingBufferedSender(
+                    endpoint=settings.azure_search_endpoint,
+                    index_name=settings.azure_search_index_name,
+                    credential=AzureKeyCredential(settings.azure_search_key),
+                    on_error=_on_error
+                ) as sender:
+                    sender.upload_documents(search_documents)
+                # with退出时flush剩余批次
+
+            await self._run_blocking(_upload)
+
+            successful_uploads = [doc_id for doc_id in doc_ids if doc_id not in failed_ids]
             print(f"✅ 成功上传 {len(successful_uploads)}/{len(documents)} 个文档到搜索索引")
 
             return successful_uploads
@@ -241,8 +288,13 @@ class AzureSearchService:
     ) -> List[Dict[str, Any]]:
         """搜索相关文档"""
         try:
-            # 生成查询向量
-            query_vector = await self.generate_single_embedding(query)
+            # 生成查询向量（重复查询命中LRU缓存，省一次embedding调用）
+            query_vector = query_embedding_cache.get(query)
+            if query_vector is None:
+                query_vector = await self.generate_single_embedding(query)
+                # 全零向量是embedding失败时的降级返回值，不缓存
+                if any(query_vector):
+                    query_embedding_cache.put(query, query_vector)
 
             # 创建向量查询
             vector_query = VectorizedQuery(
@@ -265,7 +317,9 @@ class AzureSearchService:
                 search_params["query_caption"] = "extractive"
                 search_params["query_answer"] = "extractive"
 
-            results = self.search_client.search(**search_params)
+            # search返回惰性分页迭代器，整体放线程池里取完，不让分页请求阻塞事件循环
+            results = await self._run_blocking(
+                lambda: list(self.search_client.search(**search_params)))
 
             # 处理搜索结果
             documents = []
@@ -297,11 +351,11 @@ class AzureSearchService:
         """删除指定文件的所有文档"""
         try:
             # 搜索该文件的所有文档
-            results = self.search_client.search(
+            results = await self._run_blocking(lambda: list(self.search_client.search(
                 search_text="*",
                 filter=f"file_path eq '{file_path}'",
                 select=["id"]
-            )
+            )))
 
             # 获取文档ID列表
             doc_ids = [result["id"] for result in results]
@@ -312,7 +366,7 @@ class AzureSearchService:
 
             # 删除文档
             delete_docs = [{"id": doc_id} for doc_id in doc_ids]
-            result = self.search_client.delete_documents(delete_docs)
+            result = await self._run_blocking(self.search_client.delete_documents, delete_docs)
 
             successful_deletes = sum(1 for r in result if r.succeeded)
             print(f"✅ 成功删除 {successful_deletes}/{len(doc_ids)} 个文档")
@@ -326,17 +380,17 @@ class AzureSearchService:
     async def get_index_stats(self) -> Dict[str, Any]:
         """获取索引统计信息"""
         try:
-            # 获取文档总数
-            results = self.search_client.search(
-                search_text="*",
-                include_total_count=True,
-                top=0
-            )
-
-            total_docs = results.get_count()
+            # 获取文档总数和索引信息（同一次线程池调用内完成两个阻塞请求）
+            def _stats():
+                results = self.search_client.search(
+                    search_text="*",
+                    include_total_count=True,
+                    top=0
+                )
+                return results.get_count(), self.index_client.get_index(
+                    settings.azure_search_index_name)
 
-            # 获取索引信息
-            index_info = self.index_client.get_index(settings.azure_search_index_name)
+            total_docs, index_info = await self._run_blocking(_stats)
 
             return {
                 "index_name": settings.azure_search_index_name,
@@ -354,10 +408,10 @@ class AzureSearchService:
         """清空索引中的所有文档"""
         try:
             # 获取所有文档ID
-            results = self.search_client.search(
+            results = await self._run_blocking(lambda: list(self.search_client.search(
                 search_text="*",
                 select=["id"]
-            )
+            )))
 
             doc_ids = [result["id"] for result in results]
 
@@ -367,7 +421,7 @@ class AzureSearchService:
 
             # 批量删除文档
             delete_docs = [{"id": doc_id} for doc_id in doc_ids]
-            result = self.search_client.delete_documents(delete_docs)
+            result = await self._run_blocking(self.search_client.delete_documents, delete_docs)
 
             successful_deletes = sum(1 for r in result if r.succeeded)
             print(f"✅ 成功清空索引，删除了 {successful_deletes} 个文档")
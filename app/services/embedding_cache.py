@@ -0,0 +1,45 @@
+# app/services/embedding_cache.py
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """按SHA-256(model|text)落盘的embedding缓存
+
+    跨进程、跨次运行复用：相同内容的embedding直接读本地文件，
+    完全省掉一次Azure OpenAI API调用。
+
+    向量以float16二进制存储：体积和读写带宽减半，余弦排序对
+    半精度舍入不敏感。上传到Azure索引时仍转回float32。
+    """
+
+    def __init__(self, cache_dir: str = ".emb_cache"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+
+    def _path(self, model: str, text: str) -> Path:
+        key = hashlib.sha256(f"{model}|{text}".encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.f16"
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """命中返回缓存的embedding，未命中返回None"""
+        try:
+            data = self._path(model, text).read_bytes()
+        except FileNotFoundError:
+            return None
+        return np.frombuffer(data, dtype=np.float16).astype(np.float32).tolist()
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        """写入缓存（先写临时文件再原子替换，避免并发读到半写文件）"""
+        path = self._path(model, text)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(np.asarray(embedding, dtype=np.float16).tobytes())
+        os.replace(tmp, path)
+
+
+# 创建全局embedding缓存实例
+embedding_cache = EmbeddingCache()
@@ -7,9 +7,12 @@ from app.services.rag_service import rag_service
 from app.services.azure_search_service import azure_search_service
 from app.services.mcp_service import mcp_service
 from typing import List, Dict, Any
+from dataclasses import dataclass, field
+from functools import lru_cache
 import asyncio
 import tiktoken
 import json
+import orjson
 
 # Initialize Azure LLM client
 llm = AzureChatOpenAI(
@@ -63,16 +66,40 @@ DATABASE_TOOLS = [
     }
 ]
 
-# 全局对话历史存储
-conversation_history: List[HumanMessage | AIMessage] = []
+# 滑动窗口：推理时只带上最近N轮对话，保证单次请求的token数有上界
+MAX_HISTORY_TURNS = 20
+
+DEFAULT_USER_ID = "default"
+
+@dataclass
+class Session:
+    """单个用户的对话状态，带独立锁避免并发请求互相干扰"""
+    history: List[HumanMessage | AIMessage] = field(default_factory=list)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+# 按用户隔离的会话存储（替代原来的模块级对话历史）
+sessions: Dict[str, Session] = {}
+
+def get_session(user_id: str = DEFAULT_USER_ID) -> Session:
+    """获取（或创建）指定用户的会话"""
+    return sessions.setdefault(user_id, Session())
+
+def _windowed_history(history: List[HumanMessage | AIMessage]) -> List[HumanMessage | AIMessage]:
+    """返回参与推理的最近历史（滑动窗口，最多MAX_HISTORY_TURNS轮）"""
+    return history[-MAX_HISTORY_TURNS * 2:]
 
 # Token计算工具函数
-def count_tokens_for_messages(messages: List[HumanMessage | AIMessage], model: str = "gpt-4") -> int:
-    """计算消息列表的token数量"""
+@lru_cache(maxsize=None)
+def _get_encoding(model: str = "gpt-4") -> "tiktoken.Encoding":
+    """缓存tiktoken编码器，避免每次计数重复构建"""
     try:
-        encoding = tiktoken.encoding_for_model(model)
+        return tiktoken.encoding_for_model(model)
     except KeyError:
-        encoding = tiktoken.get_encoding("o200k_base")
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens_for_messages(messages: List[HumanMessage | AIMessage], model: str = "gpt-4") -> int:
+    """计算消息列表的token数量"""
+    encoding = _get_encoding(model)
 
     total_tokens = 0
     for message in messages:
@@ -85,6 +112,18 @@ def count_tokens_for_messages(messages: List[HumanMessage | AIMessage], model: s
     total_tokens += 2
     return total_tokens
 
+def count_tokens_for_text(text: str, model: str = "gpt-4") -> int:
+    """单条消息的快速路径：跳过列表循环，直接编码文本（+6为消息开销和结束标记）"""
+    return len(_get_encoding(model).encode(text)) + 6
+
+async def _count_tokens_async(messages: List[HumanMessage | AIMessage], model: str = "gpt-4") -> int:
+    """在线程池中计算token，避免大历史的同步编码阻塞事件循环"""
+    return await asyncio.to_thread(count_tokens_for_messages, messages, model)
+
+async def _count_tokens_text_async(text: str, model: str = "gpt-4") -> int:
+    """count_tokens_for_text的线程池版本"""
+    return await asyncio.to_thread(count_tokens_for_text, text, model)
+
 # 处理函数调用
 async def handle_function_call(function_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
     """处理LLM的函数调用"""
@@ -105,7 +144,10 @@ async def handle_function_call(function_name: str, arguments: Dict[str, Any]) ->
         }
 
 # 🔹 Non-streaming version with RAG support
-async def process_prompt(prompt: str, use_rag: bool = True, use_tools: bool = True) -> Dict[str, Any]:
+async def process_prompt(prompt: str, use_rag: bool = True, use_tools: bool = True,
+                         user_id: str = DEFAULT_USER_ID) -> Dict[str, Any]:
+    session = get_session(user_id)
+
     # RAG处理：检索相关文档并增强prompt
     if use_rag:
         rag_result = await rag_service.process_query_with_rag(prompt)
@@ -115,19 +157,28 @@ async def process_prompt(prompt: str, use_rag: bool = True, use_tools: bool = Tr
         enhanced_prompt = prompt
         context_info = {"has_context": False}
 
+    # 会话级锁：同一用户的请求串行，不同用户互不阻塞
+    async with session.lock:
+        return await _process_prompt_locked(session, prompt, enhanced_prompt, context_info, use_rag, use_tools)
+
+async def _process_prompt_locked(session: Session, prompt: str, enhanced_prompt: str,
+                                 context_info: Dict[str, Any], use_rag: bool, use_tools: bool) -> Dict[str, Any]:
+    conversation_history = session.history
+
     # 添加原始用户消息到历史（用于记忆）
     user_message = HumanMessage(content=prompt)
     conversation_history.append(user_message)
 
-    # 构建推理上下文（临时的，包含RAG增强）
+    # 构建推理上下文（临时的，滑动窗口 + RAG增强）
+    recent_history = _windowed_history(conversation_history)
     if use_rag and enhanced_prompt != prompt:
         # 用增强版本替换最后一条用户消息进行推理
-        inference_context = conversation_history[:-1] + [HumanMessage(content=enhanced_prompt)]
+        inference_context = recent_history[:-1] + [HumanMessage(content=enhanced_prompt)]
     else:
-        inference_context = conversation_history
+        inference_context = recent_history
 
     # 计算输入token
-    input_tokens = count_tokens_for_messages(inference_context)
+    input_tokens = await _count_tokens_async(inference_context)
 
     # 使用callback追踪token使用，支持工具调用
     with get_openai_callback() as cb:
@@ -168,7 +219,7 @@ async def process_prompt(prompt: str, use_rag: bool = True, use_tools: bool = Tr
             conversation_history.append(tool_message)
 
         # 如果有工具调用，重新调用LLM生成最终回复
-        final_response = await llm.ainvoke(conversation_history)
+        final_response = await llm.ainvoke(_windowed_history(conversation_history))
         ai_message = AIMessage(content=final_response.content)
         conversation_history.append(ai_message)
 
@@ -190,7 +241,7 @@ async def process_prompt(prompt: str, use_rag: bool = True, use_tools: bool = Tr
     conversation_history.append(ai_message)
 
     # 计算输出token (仅AI回复)
-    output_tokens = count_tokens_for_messages([ai_message])
+    output_tokens = await _count_tokens_text_async(ai_message.content)
 
     return {
         "response": response.content,
@@ -205,11 +256,14 @@ async def process_prompt(prompt: str, use_rag: bool = True, use_tools: bool = Tr
     }
 
 # ✨ Streaming version with RAG support
-async def stream_prompt(prompt: str, use_rag: bool = True, use_tools: bool = True):
+async def stream_prompt(prompt: str, use_rag: bool = True, use_tools: bool = True,
+                        user_id: str = DEFAULT_USER_ID):
     """
     Stream LLM output chunk by chunk with RAG support.
     Used for StreamingResponse in FastAPI.
     """
+    session = get_session(user_id)
+
     # RAG处理：检索相关文档并增强prompt
     if use_rag:
         rag_result = await rag_service.process_query_with_rag(prompt)
@@ -225,24 +279,31 @@ async def stream_prompt(prompt: str, use_rag: bool = True, use_tools: bool = Tru
         enhanced_prompt = prompt
         context_info = {"has_context": False}
 
+    # 会话级锁：同一用户的流式请求串行，不同用户互不阻塞
+    async with session.lock:
+        async for chunk in _stream_prompt_locked(session, prompt, enhanced_prompt, context_info, use_rag, use_tools):
+            yield chunk
+
+async def _stream_prompt_locked(session: Session, prompt: str, enhanced_prompt: str,
+                                context_info: Dict[str, Any], use_rag: bool, use_tools: bool):
+    conversation_history = session.history
+
     # 添加原始用户消息到历史（用于记忆）
     user_message = HumanMessage(content=prompt)
     conversation_history.append(user_message)
 
-    # 构建推理上下文（临时的，包含RAG增强）
+    # 构建推理上下文（临时的，滑动窗口 + RAG增强）
+    recent_history = _windowed_history(conversation_history)
     if use_rag and enhanced_prompt != prompt:
         # 用增强版本替换最后一条用户消息进行推理
-        inference_context = conversation_history[:-1] + [HumanMessage(content=enhanced_prompt)]
+        inference_context = recent_history[:-1] + [HumanMessage(content=enhanced_prompt)]
     else:
-        inference_context = conversation_history
+        inference_context = recent_history
 
-    # 计算输入token
-    input_tokens = count_tokens_for_messages(inference_context)
-    print(f"计算的输入token: {input_tokens}")  # 调试信息
     print("开始LLM流式调用...")  # 调试信息
 
-    # 用于收集完整回复的变量
-    full_response = ""
+    # 用于收集完整回复的变量（list + join避免字符串拼接的O(n²)拷贝）
+    response_parts: List[str] = []
     usage_info = None
 
     try:
@@ -310,16 +371,16 @@ async def stream_prompt(prompt: str, use_rag: bool = True, use_tools: bool = Tru
                     print("重新调用LLM生成最终回复...")  # 调试信息
                     yield "\n\n[GENERATING_FINAL_RESPONSE]".encode("utf-8")
 
-                    async for final_chunk in llm.astream(conversation_history):
+                    async for final_chunk in llm.astream(_windowed_history(conversation_history)):
                         if final_chunk.content:
-                            full_response += final_chunk.content
+                            response_parts.append(final_chunk.content)
                             yield final_chunk.content.encode("utf-8")
 
                     # 跳出主循环，因为已经完成了完整的工具调用流程
                     break
 
                 if chunk.content:
-                    full_response += chunk.content
+                    response_parts.append(chunk.content)
                     # NOTE: must yield bytes when using StreamingResponse
                     yield chunk.content.encode("utf-8")
 
@@ -330,7 +391,7 @@ async def stream_prompt(prompt: str, use_rag: bool = True, use_tools: bool = Tru
         else:
             async for chunk in llm.astream(inference_context):
                 if chunk.content:
-                    full_response += chunk.content
+                    response_parts.append(chunk.content)
                     # NOTE: must yield bytes when using StreamingResponse
                     yield chunk.content.encode("utf-8")
 
@@ -340,13 +401,19 @@ async def stream_prompt(prompt: str, use_rag: bool = True, use_tools: bool = Tru
                     print(f"从LLM获取的usage信息: {usage_info}")  # 调试信息
 
         # 流式完成后，添加AI回复到历史
+        full_response = "".join(response_parts)
         if full_response:
             ai_message = AIMessage(content=full_response)
             conversation_history.append(ai_message)
 
-            # 计算输出token
-            output_tokens = count_tokens_for_messages([ai_message])
-            print(f"计算的输出token: {output_tokens}")  # 调试信息
+            # 优先使用LLM返回的usage统计；缺失时才在本地做一次BPE编码
+            if usage_info:
+                input_tokens = usage_info.get('input_tokens', 0)
+                output_tokens = usage_info.get('output_tokens', 0)
+            else:
+                input_tokens = await _count_tokens_async(inference_context)
+                output_tokens = await _count_tokens_text_async(ai_message.content)
+            print(f"token统计: 输入={input_tokens}, 输出={output_tokens}")  # 调试信息
 
             # 发送token统计信息和上下文信息
             token_stats = {
@@ -361,9 +428,8 @@ async def stream_prompt(prompt: str, use_rag: bool = True, use_tools: bool = Tru
             }
             print(f"最终token统计: {token_stats}")  # 调试信息
 
-            # 以特殊格式发送token统计（可被前端识别）
-            token_info = f"\n\n[TOKEN_USAGE]{json.dumps(token_stats)}[/TOKEN_USAGE]"
-            yield token_info.encode("utf-8")
+            # 以特殊格式发送token统计（可被前端识别），orjson直接输出bytes
+            yield b"\n\n[TOKEN_USAGE]" + orjson.dumps(token_stats) + b"[/TOKEN_USAGE]"
 
     except Exception as e:
         # Optional: log the error here
@@ -371,39 +437,48 @@ async def stream_prompt(prompt: str, use_rag: bool = True, use_tools: bool = Tru
         yield error_msg.encode("utf-8")
 
 # 获取token统计的流式版本（返回完整响应和token信息）
-async def stream_prompt_with_stats(prompt: str) -> Dict[str, Any]:
+async def stream_prompt_with_stats(prompt: str, user_id: str = DEFAULT_USER_ID) -> Dict[str, Any]:
     """
     流式处理并返回完整响应和token统计信息
     """
+    session = get_session(user_id)
+    async with session.lock:
+        return await _stream_prompt_with_stats_locked(session, prompt)
+
+async def _stream_prompt_with_stats_locked(session: Session, prompt: str) -> Dict[str, Any]:
+    conversation_history = session.history
+
     # 添加用户消息到历史
     user_message = HumanMessage(content=prompt)
     conversation_history.append(user_message)
 
-    # 计算输入token
-    input_tokens = count_tokens_for_messages(conversation_history)
+    # 计算输入token（滑动窗口内的历史）
+    recent_history = _windowed_history(conversation_history)
+    input_tokens = await _count_tokens_async(recent_history)
 
-    # 用于收集完整回复的变量
-    full_response = ""
+    # 用于收集完整回复的变量（list + join避免字符串拼接的O(n²)拷贝）
+    response_parts: List[str] = []
     usage_info = None
 
     try:
-        # 使用完整历史进行流式推理
-        async for chunk in llm.astream(conversation_history):
+        # 使用窗口内历史进行流式推理
+        async for chunk in llm.astream(recent_history):
             if chunk.content:
-                full_response += chunk.content
+                response_parts.append(chunk.content)
 
             # 检查是否有usage信息
             if hasattr(chunk, 'usage_metadata') and chunk.usage_metadata:
                 usage_info = chunk.usage_metadata
 
         # 流式完成后，添加AI回复到历史
+        full_response = "".join(response_parts)
         ai_message = None
         if full_response:
             ai_message = AIMessage(content=full_response)
             conversation_history.append(ai_message)
 
         # 计算输出token
-        output_tokens = count_tokens_for_messages([ai_message]) if ai_message else 0
+        output_tokens = await _count_tokens_text_async(ai_message.content) if ai_message else 0
 
         return {
             "response": full_response,
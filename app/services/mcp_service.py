@@ -1,6 +1,6 @@
 # app/services/mcp_service.py
 import asyncio
-import json
+import orjson
 import subprocess
 from typing import Dict, Any, List, Optional
 import logging
@@ -14,6 +14,8 @@ class MCPService:
         self.command = command
         self.args = args
         self.process = None
+        self._send_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
 
     async def start(self):
         """启动MCP服务进程"""
@@ -30,6 +32,10 @@ class MCPService:
             )
             logger.info(f"MCP process started with PID: {self.process.pid}")
 
+            # 启动后台写任务，批量合并待发消息减少drain次数
+            self._send_queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._writer_loop())
+
             # 等待进程启动
             await asyncio.sleep(0.5)
 
@@ -66,19 +72,54 @@ class MCPService:
 
     async def stop(self):
         """停止MCP服务进程"""
+        if self._writer_task:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+            self._send_queue = None
         if self.process:
             self.process.terminate()
             await self.process.wait()
             self.process = None
 
+    async def _writer_loop(self):
+        """后台写循环：消息在可复用缓冲区内组帧合并，单次写入+drain"""
+        # 预分配的组帧缓冲区，跨批次复用，避免每条消息的拼接分配
+        buf = bytearray(8192)
+        try:
+            while True:
+                payload = await self._send_queue.get()
+                pos = 0
+                while True:
+                    needed = pos + len(payload) + 1
+                    if needed > len(buf):
+                        buf.extend(bytes(needed - len(buf)))
+                    buf[pos:pos + len(payload)] = payload
+                    buf[pos + len(payload)] = 0x0A  # 换行帧分隔符
+                    pos = needed
+
+                    # 合并队列中已排队的消息（上限64KB，避免单批积压过大）
+                    if self._send_queue.empty() or pos >= 64 * 1024:
+                        break
+                    payload = self._send_queue.get_nowait()
+
+                self.process.stdin.write(memoryview(buf)[:pos])
+                await self.process.stdin.drain()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"MCP writer loop failed: {e}")
+
     async def _send_request(self, request: Dict[str, Any]):
-        """发送请求到MCP服务"""
+        """发送请求到MCP服务（入队，由写循环批量落盘）"""
         if not self.process or not self.process.stdin:
             raise RuntimeError("MCP service not started")
 
-        message = json.dumps(request) + "\n"
-        self.process.stdin.write(message.encode())
-        await self.process.stdin.drain()
+        # orjson直接返回bytes；换行分隔符由写循环在组帧缓冲区内补齐
+        await self._send_queue.put(orjson.dumps(request))
 
     async def _read_response(self) -> Dict[str, Any]:
         """从MCP服务读取响应"""
@@ -89,7 +130,7 @@ class MCPService:
         if not line:
             raise RuntimeError("MCP service closed")
 
-        return json.loads(line.decode().strip())
+        return orjson.loads(line)
 
     async def list_tools(self) -> List[Dict[str, Any]]:
         """获取可用工具列表"""
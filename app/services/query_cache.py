@@ -0,0 +1,57 @@
+# app/services/query_cache.py
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional
+
+
+class QueryEmbeddingCache:
+    """查询embedding的进程内LRU缓存（SHA-256精确匹配）
+
+    重复查询直接命中缓存，省掉一次Azure OpenAI embedding调用（约150-500ms）。
+    """
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """命中返回缓存的embedding，未命中返回None"""
+        key = self._key(text)
+        embedding = self._cache.get(key)
+        if embedding is None:
+            self._misses += 1
+            return None
+
+        # LRU：命中的条目移到末尾
+        self._cache.move_to_end(key)
+        self._hits += 1
+        return embedding
+
+    def put(self, text: str, embedding: List[float]):
+        """缓存查询embedding，超出容量时淘汰最久未用的条目"""
+        key = self._key(text)
+        self._cache[key] = embedding
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def cache_stats(self) -> dict:
+        """获取缓存统计信息"""
+        total = self._hits + self._misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / total if total else 0.0
+        }
+
+
+# 创建全局查询embedding缓存实例
+query_embedding_cache = QueryEmbeddingCache()
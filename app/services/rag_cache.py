@@ -0,0 +1,65 @@
+# app/services/rag_cache.py
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class RAGResultCache:
+    """RAG检索结果的TTL+LRU缓存
+
+    键为规范化查询的SHA-256。条目在ttl_seconds后过期，
+    索引内容更新后旧结果最多存活一个TTL窗口。
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(query: str) -> str:
+        return hashlib.sha256(query.strip().lower().encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """命中且未过期返回缓存值，否则返回None"""
+        entry = self._cache.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._cache[key]
+            self._misses += 1
+            return None
+
+        # LRU：命中的条目移到末尾
+        self._cache.move_to_end(key)
+        self._hits += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """写入缓存，超出容量时淘汰最久未用的条目"""
+        self._cache[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def cache_stats(self) -> dict:
+        """获取缓存统计信息"""
+        total = self._hits + self._misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / total if total else 0.0
+        }
+
+
+# 创建全局RAG结果缓存实例
+rag_result_cache = RAGResultCache()
@@ -1,6 +1,38 @@
 # app/services/rag_service.py
 from typing import List, Dict, Any, Optional
+from functools import lru_cache
+import tiktoken
 from app.services.azure_search_service import azure_search_service
+from app.services.rag_cache import rag_result_cache
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str = "gpt-4") -> "tiktoken.Encoding":
+    """缓存tiktoken编码器，避免每次检索重复构建"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+# 模块加载时预构建的prompt模板片段，避免每次查询重复拼接静态文本
+_NO_CONTEXT_TEMPLATE = """User question: {query}
+
+Note: No relevant document content was found to answer this question. Please answer based on your general knowledge and indicate that this answer is not based on the user's uploaded documents."""
+
+_CONTEXT_PROMPT_HEAD = "Answer the user's question based on the following document content{semantic}.\n\nRelevant document chunks:\n"
+
+# 稳定的chunk块分隔符：块内不嵌入随查询变化的序号/分数，
+# 相同chunk的文本跨查询逐字节一致，服务端prefix/KV缓存才可复用
+_CHUNK_BLOCK_HEAD = "<<<CHUNK {doc_id}>>>\n"
+_CHUNK_BLOCK_TAIL = "\n<<<END CHUNK>>>"
+
+_CONTEXT_PROMPT_TAIL = """
+
+User question: {query}
+
+Please answer based on the above document content. If the documents do not contain directly relevant information, please indicate this.
+
+Sources:
+"""
 
 class RAGService:
     """RAG (Retrieval-Augmented Generation) 服务"""
@@ -8,15 +40,21 @@ class RAGService:
     def __init__(self,
                  max_context_chunks: int = 5,
                  min_similarity: float = 0.7,
-                 max_context_length: int = 4000,
+                 max_context_tokens: int = 4000,
                  use_semantic_search: bool = True):
         self.max_context_chunks = max_context_chunks
         self.min_similarity = min_similarity
-        self.max_context_length = max_context_length
+        self.max_context_tokens = max_context_tokens
         self.use_semantic_search = use_semantic_search
 
     async def retrieve_relevant_context(self, query: str) -> Dict[str, Any]:
         """检索与查询相关的文档上下文"""
+        # 同一查询短时间内重复检索（如先取上下文再走完整RAG流程）直接命中缓存
+        cache_key = rag_result_cache.make_key(query)
+        cached = rag_result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             # 使用 Azure AI Search 搜索相关文档
             search_results = await azure_search_service.search_documents(
@@ -34,25 +72,29 @@ class RAGService:
                     "message": "No relevant documents found"
                 }
 
-            # 构建上下文文本
+            # 构建上下文文本（按token预算截断，而不是字符数，避免超长prompt被服务端拒绝）
+            encoding = _get_encoding()
             context_parts = []
             sources = []
-            total_length = 0
+            total_tokens = 0
 
             for i, doc in enumerate(search_results):
                 doc_content = doc["content"]
-
-                # 检查是否超过最大长度限制
-                if total_length + len(doc_content) > self.max_context_length:
-                    # 截断最后一个文档
-                    remaining_length = self.max_context_length - total_length
-                    if remaining_length > 100:  # 至少保留100个字符
-                        doc_content = doc_content[:remaining_length] + "..."
-                        context_parts.append(f"Document Chunk {i+1} (score: {doc['similarity']:.3f}):\n{doc_content}")
+                doc_tokens = encoding.encode(doc_content)
+
+                # 检查是否超过token预算
+                if total_tokens + len(doc_tokens) > self.max_context_tokens:
+                    # 在token边界截断最后一个文档
+                    remaining_tokens = self.max_context_tokens - total_tokens
+                    if remaining_tokens > 50:  # 至少保留50个token
+                        doc_content = encoding.decode(doc_tokens[:remaining_tokens]) + "..."
+                        context_parts.append(_CHUNK_BLOCK_HEAD.format(doc_id=doc["id"])
+                                             + doc_content + _CHUNK_BLOCK_TAIL)
                     break
 
-                context_parts.append(f"Document Chunk {i+1} (score: {doc['similarity']:.3f}):\n{doc_content}")
-                total_length += len(doc_content)
+                context_parts.append(_CHUNK_BLOCK_HEAD.format(doc_id=doc["id"])
+                                     + doc_content + _CHUNK_BLOCK_TAIL)
+                total_tokens += len(doc_tokens)
 
                 # 记录来源信息
                 metadata = doc.get("metadata", {})
@@ -70,7 +112,7 @@ class RAGService:
 
             context_text = "\n\n".join(context_parts)
 
-            return {
+            result = {
                 "has_context": True,
                 "context": context_text,
                 "sources": sources,
@@ -78,6 +120,8 @@ class RAGService:
                 "total_context_length": len(context_text),
                 "semantic_search_used": self.use_semantic_search
             }
+            rag_result_cache.put(cache_key, result)
+            return result
 
         except Exception as e:
             print(f"❌ RAG检索失败: {str(e)}")
@@ -93,34 +137,21 @@ class RAGService:
 
         if not context_info.get("has_context", False):
             # 没有相关上下文时的提示
-            return f"""User question: {user_query}
-
-Note: No relevant document content was found to answer this question. Please answer based on your general knowledge and indicate that this answer is not based on the user's uploaded documents."""
-
-        # 有上下文时的完整prompt
-        context = context_info["context"]
-        sources = context_info["sources"]
-
-        source_list = "\n".join([
-            f"- {source['title'] or source['file_path']} (chunk {source['chunk_index']}, score: {source['similarity']:.3f})"
-            for source in sources
-        ])
+            return _NO_CONTEXT_TEMPLATE.format(query=user_query)
 
+        # 有上下文时的完整prompt：单次append + join，不做中间字符串拼接
         semantic_info = " (Enhanced with Azure AI semantic search)" if context_info.get("semantic_search_used", False) else ""
 
-        prompt = f"""Answer the user's question based on the following document content{semantic_info}.
-
-Relevant document chunks:
-{context}
-
-User question: {user_query}
-
-Please answer based on the above document content. If the documents do not contain directly relevant information, please indicate this.
-
-Sources:
-{source_list}"""
-
-        return prompt
+        parts = [
+            _CONTEXT_PROMPT_HEAD.format(semantic=semantic_info),
+            context_info["context"],
+            _CONTEXT_PROMPT_TAIL.format(query=user_query),
+            "\n".join(
+                f"- {source['title'] or source['file_path']} (chunk {source['chunk_index']}, score: {source['similarity']:.3f})"
+                for source in context_info["sources"]
+            ),
+        ]
+        return "".join(parts)
 
     async def process_query_with_rag(self, user_query: str) -> Dict[str, Any]:
         """完整的RAG处理流程：检索 + 格式化prompt"""
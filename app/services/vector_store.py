@@ -10,8 +10,23 @@ class VectorStore:
 
     def __init__(self):
         self.chunks: Dict[str, Dict[str, Any]] = {}  # chunk_id -> chunk_data
-        self.embeddings: Dict[str, List[float]] = {}  # chunk_id -> embedding
         self.file_chunks: Dict[str, List[str]] = {}  # file_path -> [chunk_ids]
+        # 结构化存储：embedding按行存入连续的float32矩阵（行已归一化），
+        # _embedding_ids[i] 对应 _matrix[i]，检索只需一次矩阵乘法
+        self._embedding_ids: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def _append_embeddings(self, chunk_ids: List[str], embeddings: List[List[float]]):
+        """归一化后追加到矩阵末尾"""
+        block = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        np.divide(block, norms, out=block, where=norms > 0)
+
+        self._embedding_ids.extend(chunk_ids)
+        if self._matrix is None:
+            self._matrix = block
+        else:
+            self._matrix = np.vstack((self._matrix, block))
 
     def add_document_chunks(self, file_path: str, file_info: Dict[str, Any],
                            chunks: List[Dict[str, Any]]) -> List[str]:
@@ -33,12 +48,15 @@ class VectorStore:
                 "created_at": datetime.now().isoformat()
             }
 
-            # 存储embedding
-            if "embedding" in chunk and chunk["embedding"]:
-                self.embeddings[chunk_id] = chunk["embedding"]
-
             chunk_ids.append(chunk_id)
 
+        # embedding批量归一化后一次性追加到矩阵
+        embedded = [(cid, c["embedding"]) for cid, c in zip(chunk_ids, chunks)
+                    if c.get("embedding")]
+        if embedded:
+            self._append_embeddings([cid for cid, _ in embedded],
+                                    [emb for _, emb in embedded])
+
         # 记录文件的chunk映射
         self.file_chunks[file_path] = chunk_ids
 
@@ -49,37 +67,36 @@ class VectorStore:
                              top_k: int = 5,
                              min_similarity: float = 0.3) -> List[Dict[str, Any]]:
         """基于embedding相似度搜索相关chunks"""
-        if not self.embeddings:
+        if self._matrix is None or not self._embedding_ids:
             return []
 
-        query_vector = np.array(query_embedding)
-        similarities = []
-
-        for chunk_id, embedding in self.embeddings.items():
-            # 计算余弦相似度
-            chunk_vector = np.array(embedding)
-
-            # 避免除零错误
-            query_norm = np.linalg.norm(query_vector)
-            chunk_norm = np.linalg.norm(chunk_vector)
+        # 矩阵行已预归一化：只需归一化查询向量，相似度即一次矩阵乘法
+        chunk_ids = self._embedding_ids
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        qnorm = np.linalg.norm(query_vector)
+        if qnorm > 0:
+            query_vector = query_vector / qnorm
 
-            if query_norm == 0 or chunk_norm == 0:
-                similarity = 0.0
-            else:
-                similarity = np.dot(query_vector, chunk_vector) / (query_norm * chunk_norm)
+        scores = self._matrix @ query_vector
 
-            if similarity >= min_similarity:
-                similarities.append((chunk_id, similarity))
+        # argpartition选出top_k（O(N + k log k)），只对候选做排序
+        k = min(top_k, scores.size)
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx])]
+        idx = idx[scores[idx] >= min_similarity]
 
-        # 按相似度排序
-        similarities.sort(key=lambda x: x[1], reverse=True)
-
-        # 返回top_k个最相似的chunks
+        # 返回top_k个最相似的chunks（只取检索需要的字段，不复制整个chunk字典）
         results = []
-        for chunk_id, similarity in similarities[:top_k]:
-            chunk_data = self.chunks[chunk_id].copy()
-            chunk_data["similarity"] = similarity
-            results.append(chunk_data)
+        for i in idx:
+            chunk = self.chunks[chunk_ids[i]]
+            results.append({
+                "id": chunk["id"],
+                "file_path": chunk["file_path"],
+                "text": chunk["text"],
+                "index": chunk["index"],
+                "quality_score": chunk["quality_score"],
+                "similarity": float(scores[i])
+            })
 
         print(f"🔍 搜索到 {len(results)} 个相关chunks，相似度阈值: {min_similarity}")
         return results
@@ -103,12 +120,18 @@ class VectorStore:
 
         chunk_ids = self.file_chunks[file_path]
 
-        # 删除chunks和embeddings
+        # 删除chunks
         for chunk_id in chunk_ids:
             if chunk_id in self.chunks:
                 del self.chunks[chunk_id]
-            if chunk_id in self.embeddings:
-                del self.embeddings[chunk_id]
+
+        # 从矩阵中按行掩码剔除对应embedding
+        removed = set(chunk_ids)
+        if self._matrix is not None and not removed.isdisjoint(self._embedding_ids):
+            keep = np.fromiter((cid not in removed for cid in self._embedding_ids),
+                               dtype=bool, count=len(self._embedding_ids))
+            self._matrix = self._matrix[keep] if keep.any() else None
+            self._embedding_ids = [cid for cid in self._embedding_ids if cid not in removed]
 
         # 删除文件映射
         del self.file_chunks[file_path]
@@ -120,7 +143,7 @@ class VectorStore:
         """获取向量存储统计信息"""
         return {
             "total_chunks": len(self.chunks),
-            "total_embeddings": len(self.embeddings),
+            "total_embeddings": len(self._embedding_ids),
             "total_files": len(self.file_chunks),
             "files": list(self.file_chunks.keys())
         }
@@ -128,8 +151,9 @@ class VectorStore:
     def clear(self):
         """清空所有数据"""
         self.chunks.clear()
-        self.embeddings.clear()
         self.file_chunks.clear()
+        self._embedding_ids.clear()
+        self._matrix = None
         print("🧹 向量存储已清空")
 
 # 创建全局向量存储实例